@@ -6,6 +6,15 @@ import requests
 import xmltodict
 import json
 import time
+import os
+import re
+import uuid
+import random
+import cProfile
+import hashlib
+import tempfile
+import threading
+import functools
 from typing import Optional
 from fastmcp import FastMCP
 from fastmcp.server.dependencies import get_http_headers
@@ -26,14 +35,132 @@ def derive_ctx_from_headers(headers: dict) -> dict:
     return {"email": email, "level": level}
 
 
+# Opt-in profiling: send the profile header or set a sampling rate
+PROFILE_HEADER = "x-flexoffers-profile"
+PROFILE_CALL_ID_HEADER = "x-request-id"
+PROFILE_DIR = os.environ.get("FLEXOFFERS_PROFILE_DIR", ".flexoffers_profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("FLEXOFFERS_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_DIR_BYTES = int(os.environ.get("FLEXOFFERS_PROFILE_MAX_DIR_BYTES", str(50 * 1024 * 1024)))
+# Only one call is profiled at a time, concurrent calls run unprofiled
+_profile_lock = threading.Lock()
+
+
+def _profile_call_id(headers: dict) -> str:
+    """
+    Use the caller's request id when present, otherwise generate one.
+    The id is sanitized because it becomes part of a file name.
+    """
+    raw_id = headers.get(PROFILE_CALL_ID_HEADER, "")
+    call_id = re.sub(r"[^A-Za-z0-9_.-]", "_", raw_id)[:64].strip(".")
+    return call_id or uuid.uuid4().hex
+
+
+def _profile_dir_size() -> int:
+    """Total size in bytes of the profiles already written."""
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(PROFILE_DIR) if entry.is_file())
+    except OSError:
+        return 0
+
+
+def _should_profile(headers: dict) -> bool:
+    """Profile when the request asks for it or when the call is sampled."""
+    if headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def profile_tool(func):
+    """
+    Run a tool under cProfile when profiling is requested for the call.
+    The profile is written to PROFILE_DIR as <tool>-<call id>.prof.
+    Profiling is skipped when another call is being profiled or the
+    directory already holds PROFILE_MAX_DIR_BYTES of profiles.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            headers = get_http_headers() or {}
+        except Exception:
+            headers = {}
+        
+        if not _should_profile(headers) or _profile_dir_size() >= PROFILE_MAX_DIR_BYTES:
+            return func(*args, **kwargs)
+        if not _profile_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        
+        try:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(func, *args, **kwargs)
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                call_id = _profile_call_id(headers)
+                profiler.dump_stats(os.path.join(PROFILE_DIR, f"{func.__name__}-{call_id}.prof"))
+            except OSError:
+                # Never fail the tool call because the profile could not be saved
+                pass
+            return result
+        finally:
+            _profile_lock.release()
+    
+    return wrapper
+
+
 # Create server
 mcp = FastMCP("FlexOffers MCP Server")
 
 # FlexOffers API Configuration
 FLEXOFFERS_BASE_URL = "https://api.flexoffers.com/v3"
 
+# Local snapshots of seen promotion links, used by the promotions delta mode
+PROMOTIONS_SNAPSHOT_DIR = os.environ.get("FLEXOFFERS_SNAPSHOT_DIR", ".flexoffers_snapshots")
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_path(api_key: str, name: str) -> str:
+    """
+    Build the snapshot file path for an (api key, search term) pair.
+    The key is hashed so the raw API key is never written to disk.
+    """
+    key = f"{api_key}\n{name.strip().lower()}"
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(PROMOTIONS_SNAPSHOT_DIR, f"{digest}.json")
+
+
+def _load_snapshot(path: str) -> dict:
+    """Load a promotions snapshot, returning an empty one if missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if isinstance(snapshot, dict) and isinstance(snapshot.get("links"), dict):
+            return snapshot
+    except (OSError, ValueError):
+        pass
+    return {"cursor": 0, "links": {}}
+
+
+def _save_snapshot(path: str, snapshot: dict) -> None:
+    """Atomically write a promotions snapshot to disk."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _link_fingerprint(link: dict) -> str:
+    """Short stable hash of the link fields we return, used to detect changes."""
+    payload = json.dumps(link, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
 
 @mcp.tool
+@profile_tool
 def get_flexoffers_domains(api_key: str = None, limit: int = 10) -> str:
     """
     Fetch domains from FlexOffers API
@@ -96,19 +223,23 @@ def get_flexoffers_domains(api_key: str = None, limit: int = 10) -> str:
 
 
 @mcp.tool
-def get_flexoffers_promotions(api_key: str = None, name: str = None, page: int = 1, page_size: int = 10) -> str:
+@profile_tool
+def get_flexoffers_promotions(api_key: str = None, name: str = None, page: int = 1, page_size: int = 10, delta: bool = False, since_cursor: int = None) -> str:
     """
     Search for promotional LINKS, OFFERS, DEALS, and COUPONS from FlexOffers. 
     Use this tool when users ask for affiliate links, promotional offers, deals, coupons, or product links to share.
+    For recurring searches, set delta to true to only get links that are new or changed since the last poll.
     
     Args:
         api_key: FlexOffers API key (required - ask user if not provided)
         name: Search term for the promotion/offer (e.g. "nike shoes", "travel deals", "electronics")
         page: Page number (default: 1)
         page_size: Number of results per page (default: 10)
+        delta: Only return links that are new or changed since since_cursor (default: false)
+        since_cursor: Cursor returned by a previous delta call (default: the last stored cursor for this search)
         
     Returns:
-        JSON string containing promotional links and offers
+        JSON string containing promotional links and offers (plus a cursor in delta mode)
     """
     # Check if API key is provided
     if not api_key:
@@ -144,10 +275,10 @@ def get_flexoffers_promotions(api_key: str = None, name: str = None, page: int =
         
         # Extract Results
         results_container = data.get("PaginatedResultSetOfLinkDto", {}).get("Results", {})
-        if not results_container:
+        if not results_container and not delta:
              return json.dumps({"status": "success", "data": [], "total_count": 0}, indent=2)
              
-        link_dtos = results_container.get("LinkDto", [])
+        link_dtos = (results_container or {}).get("LinkDto", [])
         
         # Ensure it's a list even if single item
         if not isinstance(link_dtos, list):
@@ -164,10 +295,56 @@ def get_flexoffers_promotions(api_key: str = None, name: str = None, page: int =
                 "PromotionalTypes": item.get("PromotionalTypes"),
                 "LinkUrl": item.get("LinkUrl")
             }
+            if delta:
+                filtered_item["LinkId"] = item.get("LinkId")
             filtered_results.append(filtered_item)
             
         total_count = data.get("PaginatedResultSetOfLinkDto", {}).get("TotalCount", 0)
         
+        if delta:
+            path = _snapshot_path(api_key, name)
+            with _snapshot_lock:
+                snapshot = _load_snapshot(path)
+                previous_cursor = snapshot.get("cursor", 0)
+                if since_cursor is None:
+                    since_cursor = previous_cursor
+                
+                # Stamp new or changed links with the next cursor value
+                new_cursor = previous_cursor + 1
+                changed = False
+                for filtered_item in filtered_results:
+                    link_id = filtered_item.get("LinkId")
+                    if not link_id:
+                        continue
+                    fingerprint = _link_fingerprint(filtered_item)
+                    seen = snapshot["links"].get(link_id)
+                    if not seen or seen.get("hash") != fingerprint:
+                        snapshot["links"][link_id] = {"hash": fingerprint, "cursor": new_cursor}
+                        changed = True
+                
+                if changed:
+                    snapshot["cursor"] = new_cursor
+                    _save_snapshot(path, snapshot)
+                current_cursor = snapshot["cursor"]
+            
+            # Links without a LinkId cannot be tracked, so they are always returned
+            delta_results = [
+                filtered_item for filtered_item in filtered_results
+                if not filtered_item.get("LinkId")
+                or snapshot["links"][filtered_item["LinkId"]]["cursor"] > since_cursor
+            ]
+            
+            return json.dumps({
+                "status": "success",
+                "data": delta_results,
+                "total_count": total_count,
+                "new_or_changed_count": len(delta_results),
+                "cursor": current_cursor,
+                "since_cursor": since_cursor,
+                "page": page,
+                "page_size": page_size
+            }, indent=2)
+        
         result = {
             "status": "success",
             "data": filtered_results,
@@ -191,6 +368,7 @@ def get_flexoffers_promotions(api_key: str = None, name: str = None, page: int =
 
 
 @mcp.tool
+@profile_tool
 def get_top_programs(api_key: str = None, country_code: str = None) -> str:
     """
     Get top affiliate PROGRAMS to JOIN or APPLY for. 
@@ -262,6 +440,7 @@ def get_top_programs(api_key: str = None, country_code: str = None) -> str:
 
 
 @mcp.tool
+@profile_tool
 def apply_to_program_by_name(api_key: str = None, program_name: str = None, country_code: str = None, accept_terms: bool = None) -> str:
     """
     Find a program by name and apply to it. This tool automatically finds the correct ProgramID.
@@ -384,6 +563,7 @@ def apply_to_program_by_name(api_key: str = None, program_name: str = None, coun
 
 
 @mcp.tool
+@profile_tool
 def apply_to_program(api_key: str = None, advertiser_id: int = None, accept_terms: bool = None) -> str:
     """
     Apply to an affiliate program/advertiser on FlexOffers.
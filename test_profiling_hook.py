@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import tempfile
+import server
+
+DOMAINS_XML = """<?xml version="1.0" encoding="utf-8"?>
+  <domains>
+    <domain>
+      <domainId>177</domainId>
+      <domainUrl>example.com</domainUrl>
+    </domain>
+  </domains>"""
+
+
+class TestProfilingHook(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        patcher = patch('server.PROFILE_DIR', self.profile_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.profile_dir.cleanup)
+
+        mock_response = MagicMock()
+        mock_response.text = DOMAINS_XML
+        mock_response.raise_for_status.return_value = None
+        get_patcher = patch('server.requests.get', return_value=mock_response)
+        get_patcher.start()
+        self.addCleanup(get_patcher.stop)
+
+    @patch('server.get_http_headers')
+    def test_profile_written_when_header_set(self, mock_headers):
+        mock_headers.return_value = {"x-flexoffers-profile": "1", "x-request-id": "abc/123"}
+        server.get_flexoffers_domains.fn(api_key="test-key")
+        self.assertEqual(os.listdir(self.profile_dir.name), ["get_flexoffers_domains-abc_123.prof"])
+
+    @patch('server.get_http_headers')
+    def test_no_profile_without_header(self, mock_headers):
+        mock_headers.return_value = {}
+        server.get_flexoffers_domains.fn(api_key="test-key")
+        self.assertEqual(os.listdir(self.profile_dir.name), [])
+
+    @patch('server.get_http_headers')
+    def test_no_profile_when_disk_cap_reached(self, mock_headers):
+        mock_headers.return_value = {"x-flexoffers-profile": "1"}
+        with patch('server.PROFILE_MAX_DIR_BYTES', 0):
+            server.get_flexoffers_domains.fn(api_key="test-key")
+        self.assertEqual(os.listdir(self.profile_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,37 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import json
+import tempfile
 import server
 
+DELTA_XML_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+  <PaginatedResultSetOfLinkDto>
+    <Results>{links}</Results>
+    <TotalCount>{count}</TotalCount>
+  </PaginatedResultSetOfLinkDto>"""
+
+DELTA_LINK_TEMPLATE = """
+      <LinkDto>
+        <AdvertiserId>168490</AdvertiserId>
+        <AdvertiserName>NIKE</AdvertiserName>
+        <LinkId>{link_id}</LinkId>
+        <LinkName>{link_name}</LinkName>
+        <LinkDescription>{link_name}</LinkDescription>
+        <PromotionalTypes>General Promotion</PromotionalTypes>
+        <LinkUrl>https://track.flexlinkspro.com/g.ashx?foid={link_id}</LinkUrl>
+      </LinkDto>"""
+
+
+def build_delta_response(links):
+    xml = DELTA_XML_TEMPLATE.format(
+        links="".join(DELTA_LINK_TEMPLATE.format(link_id=link_id, link_name=link_name) for link_id, link_name in links),
+        count=len(links)
+    )
+    mock_response = MagicMock()
+    mock_response.text = xml
+    mock_response.raise_for_status.return_value = None
+    return mock_response
+
 class TestFlexOffersPromotions(unittest.TestCase):
     
     @patch('server.requests.get')
@@ -96,5 +125,49 @@ class TestFlexOffersPromotions(unittest.TestCase):
         item2 = result['data'][1]
         self.assertEqual(item2['LinkName'], "Men's Shoe Nike Blazer Low '77 Vintage, Shop Nike.com")
 
+
+class TestFlexOffersPromotionsDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        patcher = patch('server.PROMOTIONS_SNAPSHOT_DIR', self.snapshot_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.snapshot_dir.cleanup)
+
+    def call_delta(self, **kwargs):
+        return json.loads(server.get_flexoffers_promotions.fn(api_key="test-key", name="nike shoe", delta=True, **kwargs))
+
+    @patch('server.requests.get')
+    def test_delta_returns_only_new_or_changed_links(self, mock_get):
+        mock_get.return_value = build_delta_response([("1.1", "Blazer Mid"), ("1.2", "Blazer Low")])
+        first = self.call_delta()
+        self.assertEqual(first['status'], 'success')
+        self.assertEqual([item['LinkId'] for item in first['data']], ['1.1', '1.2'])
+        self.assertEqual(first['cursor'], 1)
+
+        # Same results again: nothing new, cursor unchanged
+        second = self.call_delta()
+        self.assertEqual(second['data'], [])
+        self.assertEqual(second['cursor'], 1)
+
+        # One changed link and one new link
+        mock_get.return_value = build_delta_response([("1.1", "Blazer Mid"), ("1.2", "Blazer Low Sale"), ("1.3", "Air Max")])
+        third = self.call_delta()
+        self.assertEqual([item['LinkId'] for item in third['data']], ['1.2', '1.3'])
+        self.assertEqual(third['cursor'], 2)
+
+        # Replaying from an older cursor returns everything changed after it
+        replay = self.call_delta(since_cursor=0)
+        self.assertEqual(len(replay['data']), 3)
+
+    @patch('server.requests.get')
+    def test_delta_snapshots_are_per_search_term(self, mock_get):
+        mock_get.return_value = build_delta_response([("1.1", "Blazer Mid")])
+        self.call_delta()
+        other = json.loads(server.get_flexoffers_promotions.fn(api_key="test-key", name="adidas", delta=True))
+        self.assertEqual(len(other['data']), 1)
+
+
 if __name__ == '__main__':
     unittest.main()